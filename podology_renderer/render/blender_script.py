@@ -2,76 +2,33 @@ import os
 import sys
 import bpy
 import json
+import traceback
+
+import numpy as np
 
 print(f"Blender script starting...")
 print(f"Python executable: {sys.executable}")
 print(f"Working directory: {os.getcwd()}")
 
 #
-# File loading
+# This script runs as a long-lived Blender process: the canvas is loaded once, then
+# jobs are read from stdin, one JSON object per line:
 #
-canvas_path = "podology_renderer/render/canvas.blend"
-
-# Process command line arguments (the pickle file path):
-args = sys.argv
-print(f"All arguments: {args}")
-
-if "--" in args:
-    args = args[args.index("--") + 1:]
-else:
-    raise ValueError("No arguments provided.")
-
-if len(args) != 3:
-    raise ValueError("Expected 3 arguments: ticker pickle path, job ID, frame step.")
-
-ticker_path, job_id, frame_step = args
-print(f"Ticker path: {ticker_path}")
-print(f"Job ID: {job_id}")
-print(f"Frame step: {frame_step}")
-
-if not os.path.exists(ticker_path):
-    raise FileNotFoundError(f"Ticker file not found: {ticker_path}")
-
-with open(ticker_path, "rb") as file:
-    ticker = json.load(file)
-
-print(f"Ticker loaded: {ticker}")
-
+#     {"ticker_path": ..., "job_id": ..., "frame_step": ...}
 #
-# Implement the Appearance.frame() method logic
+# After each job, a line starting with JOB_END_MARKER reports "done" or "failed".
+# Keep the marker in sync with render_functions.py.
 #
-def appearance_frame(appearance_data, t):
-    """
-    Implement the Appearance.frame() method logic.
-    Returns the envelope value at time t.
-    """
-    start = appearance_data['start']
-    end = appearance_data['end']
-    
-    if t <= start:
-        return 0.0
-    elif end <= t:
-        return 1.0
-    else:
-        # Linear interpolation between start and end:
-        return (t - start) / (end - start)
+JOB_END_MARKER = "@@podology-renderer-job-end@@"
 
-#
-# Implement the Ticker.get_value() method logic
-#
-def get_value(ticker_data, apid, t):
-    """
-    Implement the Ticker.get_value() method logic.
-    Search for the appearance by apid and return its frame value at time t.
-    """
-    for lane in ticker_data['lanes']:
-        for appearance in lane:
-            if appearance['apid'] == apid:
-                return appearance_frame(appearance, t)
-    return 0.0
+canvas_path = "podology_renderer/render/canvas.blend"
+lane_spacing = 1.5
+
+# The current job's text objects, kept so we never have to scan bpy.data.objects:
+ANIMATED = []
 
 #
-# Render preparations
+# Render preparations (shared by all jobs)
 #
 
 # Load the prepared .blend file
@@ -88,24 +45,43 @@ print(f"Opened canvas file: {canvas_path}")
 #
 bpy.data.scenes["Scene"].render.engine = "BLENDER_EEVEE_NEXT"
 
+# Text on a plain background needs none of EEVEE's expensive effects; pin them here
+# instead of inheriting whatever the canvas was saved with. A few render samples are
+# kept, as they anti-alias the glyph edges. Not every option exists in every EEVEE
+# version (EEVEE Next dropped bloom and SSR), so skip missing ones:
+eevee = bpy.context.scene.eevee
+for option, value in (
+    ("taa_render_samples", 8),
+    ("use_bloom", False),
+    ("use_ssr", False),
+    ("use_gtao", False),
+    ("use_motion_blur", False),
+    ("use_raytracing", False),
+):
+    if hasattr(eevee, option):
+        setattr(eevee, option, value)
+bpy.context.scene.render.use_motion_blur = False
+
+# Keep render data between frames instead of rebuilding it for each one:
+bpy.context.scene.render.use_persistent_data = True
+
 # Verify/Set render output to video (if not already configured in the .blend file)
-bpy.context.scene.render.filepath = f"podology_renderer/render/tmp/{job_id}.mp4"
 bpy.context.scene.render.image_settings.file_format = "FFMPEG"
 bpy.context.scene.render.ffmpeg.format = "MPEG4"  # H.264 MP4
-bpy.data.scenes["Scene"].render.fps = ticker['fps']
-bpy.data.scenes["Scene"].frame_step = int(frame_step)
+bpy.context.scene.render.ffmpeg.codec = "H264"
+# Favour encoding speed; constant-quality CRF keeps text edges clean enough:
+bpy.context.scene.render.ffmpeg.constant_rate_factor = "MEDIUM"
+bpy.context.scene.render.ffmpeg.ffmpeg_preset = "REALTIME"
+bpy.context.scene.render.ffmpeg.use_autosplit = False
+
+# Use all available cores:
+bpy.context.scene.render.threads_mode = "FIXED"
+bpy.context.scene.render.threads = max(1, os.cpu_count() or 1)
 
 # Remove this line since we're using EEVEE, not Cycles
 # bpy.data.scenes["Scene"].cycles.device = "GPU"
 
-lane_spacing = 1.5
-bpy.context.scene.frame_end = int(ticker['end'] * ticker['fps'])
-
-#
-# Create text objects
-#
-
-# First, check existence of the shared material:
+# Check existence of the shared material:
 print("Checking for 'word_material'...")
 print(f"Available materials: {list(bpy.data.materials.keys())}")
 
@@ -115,71 +91,159 @@ else:
     mat = bpy.data.materials["word_material"]
     print(f"Found material 'word_material': {mat}")
 
-print(f"Creating text objects for {len(ticker['lanes'])} lanes...")
-
-# Create the objects:
-for lane_idx, lane in enumerate(ticker["lanes"]):
-    y_loc = lane_idx * lane_spacing
-    print(f"Processing lane {lane_idx} with {len(lane)} appearances")
-    
-    for appearance in lane:
-        # Create the text object
-        bpy.ops.object.text_add(location=(0, y_loc, 0))
-        text_obj = bpy.context.object
-        text_obj.data.body = appearance["term"]
 
-        text_obj.name = appearance['apid']
+def render_job(ticker_path, job_id, frame_step):
+    """Create the text objects of one ticker, animate them and render the video."""
+    print(f"Ticker path: {ticker_path}")
+    print(f"Job ID: {job_id}")
+    print(f"Frame step: {frame_step}")
+
+    if not os.path.exists(ticker_path):
+        raise FileNotFoundError(f"Ticker file not found: {ticker_path}")
+
+    #
+    # The ticker comes as flat arrays (one entry per appearance):
+    #
+    with np.load(ticker_path) as data:
+        apids = data["apids"]
+        terms = data["terms"]
+        lanes = data["lane"]
+        starts = data["starts"]
+        ends = data["ends"]
+        fps = int(data["fps"])
+        ticker_end = float(data["end"])
+
+    print(f"Ticker loaded: {len(apids)} appearances in {lanes.max(initial=-1) + 1} lanes")
+
+    scene = bpy.context.scene
+    scene.render.filepath = f"podology_renderer/render/tmp/{job_id}.mp4"
+    scene.render.fps = fps
+    scene.frame_step = int(frame_step)
+    scene.frame_end = int(ticker_end * fps)
+
+    #
+    # Create text objects
+    #
+    print(f"Creating {len(apids)} text objects...")
+
+    # Appearances of the same term share one text curve; only objects are animated:
+    curve_cache = {}
+
+    for apid, term, lane_idx in zip(apids, terms, lanes):
+        y_loc = lane_idx * lane_spacing
+        term = str(term)
+
+        # Create the text object; through bpy.data rather than bpy.ops.object.text_add,
+        # which goes through the whole operator machinery for every object:
+        if term not in curve_cache:
+            curve_cache[term] = bpy.data.curves.new(name=term, type="FONT")
+            curve_cache[term].body = term
+            curve_cache[term].materials.append(mat)
+        curve = curve_cache[term]
+
+        text_obj = bpy.data.objects.new(name=str(apid), object_data=curve)
+        text_obj.location = (0, y_loc, 0)
         text_obj["value"] = 0.0
-    
-        if text_obj.data.materials:
-            text_obj.data.materials[0] = mat
-        else:
-            text_obj.data.materials.append(mat)
-        
-        print(f"Created text object '{text_obj.name}' with text '{appearance['term']}'")
+        scene.collection.objects.link(text_obj)
+        ANIMATED.append(text_obj)
+
+        print(f"Created text object '{text_obj.name}' with text '{term}' in lane {lane_idx}")
+
+    #
+    # Animate: the envelope of an appearance is a linear ramp from 0 at its start to
+    # 1 at its end, constant before and after. Two LINEAR keyframes on the "value"
+    # F-Curve (with the default constant extrapolation) reproduce Appearance.frame()
+    # exactly at any frame, so nothing needs to be sampled per frame. The x location
+    # is derived from "value" by a driver; its expression is simple enough for
+    # Blender to evaluate natively, without calling into Python per frame.
+    #
+    # Keyframe coordinates of all objects as one table, a row of (frame, value) x 2:
+    key_points = np.empty((len(apids), 4), dtype=np.float32)
+    key_points[:, 0] = starts * fps
+    key_points[:, 1] = 0.0
+    key_points[:, 2] = ends * fps
+    key_points[:, 3] = 1.0
+
+    print(f"Adding keyframes to {len(apids)} objects...")
+
+    # ANIMATED is in the same order as the ticker arrays, so no name lookups needed:
+    for obj, apid, co in zip(ANIMATED, apids, key_points):
+        obj.animation_data_create()
+        action = bpy.data.actions.new(name=str(apid))
+        obj.animation_data.action = action
+
+        fcurve = action.fcurves.new(data_path='["value"]')
+        fcurve.keyframe_points.add(2)
+        fcurve.keyframe_points.foreach_set("co", co)
+        for point in fcurve.keyframe_points:
+            point.interpolation = "LINEAR"
+        fcurve.extrapolation = "CONSTANT"  # hold 0 before start and 1 after end
+        fcurve.update()
+
+        driver = obj.driver_add("location", 0).driver  # x location
+        driver.type = "SCRIPTED"
+        var = driver.variables.new()
+        var.name = "value"
+        var.type = "SINGLE_PROP"
+        var.targets[0].id = obj
+        var.targets[0].data_path = '["value"]'
+        driver.expression = "value * -22"
+
+    #
+    # Render the animation
+    #
+    print(f"Starting render for job {job_id}")
+    print(f"Output path: {scene.render.filepath}")
+    print(f"Frame range: 1 to {scene.frame_end}")
+
+    bpy.ops.render.render(animation=True)
+    print(f"Render completed successfully for job {job_id}")
+
+    # Verify the output file was created
+    output_path = scene.render.filepath
+    if not os.path.exists(output_path):
+        raise FileNotFoundError(f"Output file not found at {output_path}")
+
+    file_size = os.path.getsize(output_path)
+    print(f"Output file created: {output_path} (size: {file_size} bytes)")
+
+
+def clear_job():
+    """Remove a job's text objects with their curves and actions from the canvas."""
+    curves = set()
+    for obj in ANIMATED:
+        curves.add(obj.data)
+        action = obj.animation_data.action if obj.animation_data else None
+        bpy.data.objects.remove(obj)
+        if action is not None:
+            bpy.data.actions.remove(action)
+
+    for curve in curves:
+        bpy.data.curves.remove(curve)
+
+    ANIMATED.clear()
 
-#
-# Add a handler that updates the values of the text objects upon frame change;
-# Also inserts keyframes at each frame, as this is necessary for headless rendering.
-#
-def update_values(scene):
-    current_frame = scene.frame_current
-    for obj in bpy.data.objects:
-        if "value" in obj:
-            t = current_frame / ticker['fps']
-            val = get_value(ticker, obj.name, t)  # Use our implemented get_value function
-            obj["value"] = val
-            obj.location.x = obj["value"] * (-22)
-            
-            # Insert keyframes for animation
-            obj.keyframe_insert(data_path="location", frame=current_frame, index=0)  # x location
-            obj.keyframe_insert(data_path='["value"]', frame=current_frame)
-
-bpy.app.handlers.frame_change_post.clear()  # Clear existing handlers if needed
-bpy.app.handlers.frame_change_post.append(update_values)
 
 #
-# Render the animation
+# Job loop
 #
-print(f"Starting render for job {job_id}")
-print(f"Output path: {bpy.context.scene.render.filepath}")
-print(f"Frame range: 1 to {bpy.context.scene.frame_end}")
+print("Waiting for jobs...", flush=True)
 
-try:
-    bpy.ops.render.render(animation=True)
-    print(f"Render completed successfully for job {job_id}")
-    
-    # Verify the output file was created
-    output_path = bpy.context.scene.render.filepath
-    if os.path.exists(output_path):
-        file_size = os.path.getsize(output_path)
-        print(f"Output file created: {output_path} (size: {file_size} bytes)")
-    else:
-        print(f"ERROR: Output file not found at {output_path}")
-        sys.exit(1)
-        
-except Exception as e:
-    print(f"ERROR during rendering: {str(e)}")
-    import traceback
-    traceback.print_exc()
-    sys.exit(1)
+for line in sys.stdin:
+    if not line.strip():
+        continue
+
+    job_id = None
+    try:
+        spec = json.loads(line)
+        job_id = spec["job_id"]
+        render_job(spec["ticker_path"], job_id, spec["frame_step"])
+        status = "done"
+    except Exception as e:
+        print(f"ERROR during rendering: {str(e)}")
+        traceback.print_exc(file=sys.stdout)
+        status = "failed"
+    finally:
+        clear_job()
+
+    print(f"{JOB_END_MARKER} {job_id} {status}", flush=True)
@@ -1,47 +1,175 @@
 import os
 from pathlib import Path
-import shelve
+import sqlite3
+import shutil
 import subprocess
-import pickle
+import hashlib
 import json
+import queue
+import threading
+import time
+from collections import deque
 
+import numpy as np
 from loguru import logger
 
-JDB = "jobs.db"
+JDB = "jobs.sqlite3"
+RENDER_DIR = Path(__file__).parent
+# Cached videos, one per ticker digest; no job renders into this directory:
+VIDEO_CACHE_DIR = Path("podology_renderer/render/tmp/cache")
+BLENDER_LOG_TAIL = 500  # lines of Blender output kept for error reports
+BLENDER_JOB_TIMEOUT = 3 * 60 * 60  # seconds a job may take before Blender is killed
+
+
+class JobStore:
+    """Job state in SQLite, one row per job; used like a dict of job dicts.
+
+    Every update is a single-row UPSERT, and WAL mode lets status requests read
+    while a rendering task writes. Also holds the rendered video cache.
+
+    One store (and connection) is shared by the whole process, see `get_jobs`;
+    using it as a context manager holds its lock, as requests and background
+    tasks run in different threads.
+    """
+
+    def __init__(self, path: str = JDB):
+        self.conn = sqlite3.connect(
+            path, isolation_level=None, check_same_thread=False
+        )
+        self.lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs"
+            " (job_id TEXT PRIMARY KEY, status TEXT, payload BLOB)"
+        )
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS video_cache"
+            " (digest TEXT PRIMARY KEY, video_path TEXT)"
+        )
+
+    def __enter__(self):
+        self.lock.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.lock.release()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+    def get(self, job_id: str, default=None):
+        row = self.conn.execute(
+            "SELECT payload FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return default if row is None else json.loads(row[0])
+
+    def __setitem__(self, job_id: str, job: dict):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO jobs (job_id, status, payload) VALUES (?, ?, ?)",
+            (job_id, job["status"], json.dumps(job)),
+        )
+
+    def get_cached_video(self, digest: str):
+        """Path of a video rendered earlier for the same ticker digest, or None."""
+        row = self.conn.execute(
+            "SELECT video_path FROM video_cache WHERE digest = ?", (digest,)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def cache_video(self, digest: str, video_path: str):
+        self.conn.execute(
+            "INSERT OR REPLACE INTO video_cache (digest, video_path) VALUES (?, ?)",
+            (digest, video_path),
+        )
+
+
+_JOBS = None
 
 
 def get_jobs():
-    return shelve.open(JDB, writeback=True)
+    """Return the process-wide JobStore, open it on first use."""
+    global _JOBS
+    if _JOBS is None:
+        _JOBS = JobStore(JDB)
+    return _JOBS
 
 
-def process_video(ticker_path: Path, job_id: str, frame_step: int):
+def close_jobs():
+    """Close the process-wide JobStore, if open."""
+    global _JOBS
+    if _JOBS is not None:
+        _JOBS.close()
+        _JOBS = None
+
+
+def ticker_digest(arrays: dict, frame_step: int) -> str:
+    """Content hash of everything that determines a rendered video.
+
+    Covers the Ticker arrays handed to Blender, the frame step, and the Blender
+    script and canvas, so that editing either of those invalidates cached videos.
+
+    Args:
+        arrays (dict): The named arrays that are written to the .npz file.
+        frame_step (int): The step size for rendering frames.
+    Returns:
+        str: Hex digest, used to key the video cache in the JobStore.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    for name in sorted(arrays):
+        array = np.ascontiguousarray(arrays[name])
+        h.update(f"{name}:{array.dtype}:{array.shape}".encode())
+        h.update(array.tobytes())
+    h.update(f"frame_step:{frame_step}".encode())
+    for path in (RENDER_DIR / "blender_script.py", RENDER_DIR / "canvas.blend"):
+        h.update(path.read_bytes())
+    return h.hexdigest()
+
+
+def process_video(ticker, job_id: str, frame_step: int):
     """Render and store video, put output info into JOBS dict.
 
     Args:
-        ticker_path (str): path to the pickled Ticker object.
+        ticker (Ticker): the Ticker to render.
         job_id (str): the job ID
         frame_step (int): The step size for rendering frames.
     Returns:
         None: Only side effects (create video file, set result of job in JOBS).
     """
     logger.info(f"{job_id}: Starting video processing")
-    tickerJSON_path = ticker_path.with_suffix(".json")
+    tickerNPZ_path = Path(f"podology_renderer/render/tmp/{job_id}.npz")
 
     try:
-        # Can't use Ticker code in Blender, so use dict:
-        logger.debug(f"{job_id}: Loading Ticker object from {ticker_path}")
-        with open(ticker_path, "rb") as file:
-            ticker = pickle.load(file)
-
-        ticker_dict = ticker.to_dict()
-
-        with open(tickerJSON_path, "w") as f:
-            json.dump(ticker_dict, f)
+        arrays = ticker.to_arrays()
 
+        # Identical tickers render identical videos, so reuse an earlier one if we can:
+        digest = ticker_digest(arrays, frame_step)
         with get_jobs() as jobs:
-            jobs[job_id] = {"status": "processing", "json_path": str(tickerJSON_path)}
-
-        result = run_blender(tickerJSON_path, job_id, frame_step)
+            cached_video = jobs.get_cached_video(digest)
+
+        if cached_video is not None and Path(cached_video).exists():
+            video_path = f"podology_renderer/render/tmp/{job_id}.mp4"
+            logger.info(f"{job_id}: Reusing cached video {cached_video}")
+            shutil.copyfile(cached_video, video_path)
+            result = {"video_path": video_path, "cached_from": cached_video}
+        else:
+            # Can't use Ticker code in Blender, so pass plain arrays; each is written
+            # as its raw buffer, never through pickle:
+            np.savez(tickerNPZ_path, allow_pickle=False, **arrays)
+            with get_jobs() as jobs:
+                jobs[job_id] = {
+                    "status": "processing",
+                    "npz_path": str(tickerNPZ_path),
+                }
+
+            result = run_blender(tickerNPZ_path, job_id, frame_step)
+            # Job outputs get overwritten when a job ID is rendered again, so the
+            # cache keeps its own copy, named by digest:
+            VIDEO_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+            cache_path = str(VIDEO_CACHE_DIR / f"{digest}.mp4")
+            shutil.copyfile(result["video_path"], cache_path)
+            with get_jobs() as jobs:
+                jobs.cache_video(digest, cache_path)
 
         with get_jobs() as jobs:
             jobs[job_id] = {"status": "done", "result": result}
@@ -74,109 +202,215 @@ def process_video(ticker_path: Path, job_id: str, frame_step: int):
             jobs[job_id] = {"status": "failed", "error": error_data}
     finally:
         # Clean up temporary files
-        if ticker_path.exists():
-            ticker_path.unlink()
-            logger.debug(f"Cleaned up temporary file {ticker_path}")
-        if tickerJSON_path.exists():
-            tickerJSON_path.unlink()
-            logger.debug(f"Cleaned up Blender data file {tickerJSON_path}")
+        if tickerNPZ_path.exists():
+            tickerNPZ_path.unlink()
+            logger.debug(f"Cleaned up Blender data file {tickerNPZ_path}")
+
+
+class BlenderDaemon:
+    """A long-lived Blender process that renders the jobs sent to it.
+
+    Starting Blender and loading the canvas takes several seconds, so instead of
+    spawning Blender per job, blender_script.py runs as a loop that reads one JSON
+    job spec per line from stdin and reports the end of each job with a line that
+    starts with `JOB_END_MARKER`. The process is started lazily and restarted if it
+    has died. Jobs are rendered one at a time; one that takes longer than
+    `BLENDER_JOB_TIMEOUT` gets the process killed, so it can't block later jobs.
+    """
+
+    # Keep in sync with blender_script.py:
+    JOB_END_MARKER = "@@podology-renderer-job-end@@"
+
+    def __init__(self, blender_path="blender", render_script="blender_script.py"):
+        render_script_resolved = str((Path(__file__).parent / render_script).resolve())
+        self.cmd = [
+            blender_path,
+            "--background",
+            "--python",
+            render_script_resolved,
+        ]
+        self.proc = None
+        self.lines = None  # queue of the process' output lines, None at its end
+        self.lock = threading.Lock()
+
+    def _ensure_running(self):
+        if self.proc is not None and self.proc.poll() is None:
+            return
+
+        env = os.environ.copy()
+        env["PYTHONPATH"] = "/podology_renderer"
+
+        logger.info(f"Starting Blender daemon: {' '.join(self.cmd)}")
+        self.proc = subprocess.Popen(
+            self.cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            bufsize=1,
+            text=True,
+            env=env,
+        )
+
+        # Read the output in a thread, so that waiting for it can time out:
+        self.lines = queue.Queue()
+        threading.Thread(
+            target=self._read_output,
+            args=(self.proc.stdout, self.lines),
+            daemon=True,
+        ).start()
+
+    @staticmethod
+    def _read_output(stdout, lines: queue.Queue):
+        for line in stdout:
+            lines.put(line)
+        lines.put(None)
+
+    def _kill(self):
+        self.proc.kill()
+        self.proc.wait()
+        self.proc = None
+
+    def render(self, tickerNPZ_path: Path, job_id: str, frame_step: int) -> dict:
+        """Send a job to Blender and wait for it to finish.
+
+        Blender's output is streamed line by line to the log instead of buffering
+        all of it; only the last `BLENDER_LOG_TAIL` lines are kept.
+
+        Returns:
+            dict: "status" ("done", "failed", "died" or "timeout"), "stdout"
+            (output tail) and, if the process died, its "return_code".
+        """
+        spec = {
+            "ticker_path": str(tickerNPZ_path),
+            "job_id": job_id,
+            "frame_step": frame_step,
+        }
+        tail = deque(maxlen=BLENDER_LOG_TAIL)
+
+        with self.lock:
+            self._ensure_running()
+            try:
+                self.proc.stdin.write(json.dumps(spec) + "\n")
+                self.proc.stdin.flush()
+            except BrokenPipeError:
+                pass  # Blender died; reading stdout below runs into EOF.
+
+            deadline = time.monotonic() + BLENDER_JOB_TIMEOUT
+            while True:
+                try:
+                    line = self.lines.get(
+                        timeout=max(0.0, deadline - time.monotonic())
+                    )
+                except queue.Empty:
+                    logger.error(f"{job_id}: Blender timed out, killing it")
+                    self._kill()
+                    return {"status": "timeout", "stdout": "".join(tail)}
+                if line is None:
+                    break
+                if line.startswith(self.JOB_END_MARKER):
+                    status = line.split()[-1]
+                    return {"status": status, "stdout": "".join(tail)}
+                logger.debug(f"{job_id}: Blender: {line.rstrip()}")
+                tail.append(line)
+
+            return_code = self.proc.wait()
+            return {
+                "status": "died",
+                "stdout": "".join(tail),
+                "return_code": return_code,
+            }
+
+
+_BLENDER_DAEMONS = {}
+_BLENDER_DAEMONS_LOCK = threading.Lock()
+
+
+def get_blender_daemon(blender_path="blender", render_script="blender_script.py"):
+    """Return the Blender daemon for the given executable and script, create if new."""
+    key = (blender_path, render_script)
+    # Background tasks call this concurrently; two daemons would be two Blenders:
+    with _BLENDER_DAEMONS_LOCK:
+        if key not in _BLENDER_DAEMONS:
+            _BLENDER_DAEMONS[key] = BlenderDaemon(blender_path, render_script)
+        return _BLENDER_DAEMONS[key]
 
 
 def run_blender(
-    tickerJSON_path: Path,
+    tickerNPZ_path: Path,
     job_id: str,
     frame_step: int,
     blender_path="blender",
     render_script="blender_script.py",
 ) -> dict:
-    """Call Blender to run blender_script.py for a given episode.
+    """Have Blender run blender_script.py for a given episode.
 
-    This script takes the temp file path of stored timed named entities and renders
-    a video, storing it in the same dir.
+    The job is handed to the persistent Blender daemon, which takes the temp file
+    path of stored timed named entities and renders a video, storing it in the
+    same dir.
 
     Args:
-        tickerJSON_path (Path): Path to the serialized Ticker object.
+        tickerNPZ_path (Path): Path to the Ticker arrays (.npz).
         job_id (str): The job ID of the rendering job.
         frame_step (int): The step size for rendering frames.
         blender_path (str): Path to the Blender executable.
         render_script (str): Path to the Blender Python script to run.
     Returns:
-        dict: Result of the rendering process (stdout, stderr, video path)
+        dict: Result of the rendering process (stdout, video path). Blender's
+        stderr is merged into stdout, and only the last `BLENDER_LOG_TAIL` lines
+        are kept; the full output goes to the log as it is produced.
     """
     logger.debug(f"Running Blender...")
 
-    render_script_resolved = str((Path(__file__).parent / render_script).resolve())
-
-    cmd = [
-        blender_path,
-        "--background",
-        "--python",
-        render_script_resolved,
-        "--",
-        str(tickerJSON_path),
-        job_id,
-        str(frame_step),
-    ]
-
-    env = os.environ.copy()
-    env["PYTHONPATH"] = "/podology_renderer"
-
-    logger.debug(f"Running Blender command: {' '.join(cmd)}")
-    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
-
-    stdout = result.stdout
-    stderr = result.stderr
-    return_code = result.returncode
-
-    logger.debug(f"Blender return code: {return_code}")
-    logger.debug(f"Blender stdout: {stdout}")
-    if stderr:
-        logger.warning(f"Blender stderr: {stderr}")
-
-    # Check if Blender process succeeded
-    if return_code != 0:
-        error_msg = f"Blender process failed with return code {return_code}"
+    daemon = get_blender_daemon(blender_path, render_script)
+    result = daemon.render(tickerNPZ_path, job_id, frame_step)
+    stdout = result["stdout"]
+
+    logger.debug(f"Blender job status: {result['status']}")
+
+    # Check if Blender succeeded
+    if result["status"] != "done":
+        if result["status"] == "died":
+            error_msg = (
+                f"Blender process died with return code {result['return_code']}"
+            )
+        elif result["status"] == "timeout":
+            error_msg = f"Blender job timed out after {BLENDER_JOB_TIMEOUT} s"
+        else:
+            error_msg = "Blender failed to render the job"
         logger.error(f"{job_id}: {error_msg}")
-        logger.error(f"{job_id}: Blender stdout: {stdout}")
-        logger.error(f"{job_id}: Blender stderr: {stderr}")
+        logger.error(f"{job_id}: Blender output (tail): {stdout}")
 
         # Create a structured error that includes all the debugging info
         raise RuntimeError(
             {
                 "message": error_msg,
-                "return_code": return_code,
+                "return_code": result.get("return_code"),
                 "stdout": stdout,
-                "stderr": stderr,
-                "command": " ".join(cmd),
+                "command": " ".join(daemon.cmd),
             }
         )
 
     # Verify the output video file was created
-    video_path = f"podology_renderer/render/tmp/{Path(tickerJSON_path).stem}.mp4"
+    video_path = f"podology_renderer/render/tmp/{Path(tickerNPZ_path).stem}.mp4"
     video_path_obj = Path(video_path)
 
     if not video_path_obj.exists():
         error_msg = f"Blender completed but output video file not found at {video_path}"
         logger.error(f"{job_id}: {error_msg}")
-        logger.error(f"{job_id}: Blender stdout: {stdout}")
-        logger.error(f"{job_id}: Blender stderr: {stderr}")
+        logger.error(f"{job_id}: Blender output (tail): {stdout}")
 
         # Create a structured error for missing output file
         raise RuntimeError(
             {
                 "message": error_msg,
-                "return_code": return_code,
                 "stdout": stdout,
-                "stderr": stderr,
                 "expected_path": video_path,
-                "command": " ".join(cmd),
+                "command": " ".join(daemon.cmd),
             }
         )
 
     logger.info(f"Video successfully created at {video_path}")
     return {
         "stdout": stdout,
-        "stderr": stderr,
         "video_path": video_path,
-        "return_code": return_code,
     }
@@ -1,7 +1,16 @@
+import bisect
+import heapq
+from operator import attrgetter
 from typing import List
 
+import numpy as np
+import plotly.graph_objects as go
+from plotly.subplots import make_subplots
+
 
 class Appearance:
+    __slots__ = ("term", "apid", "start", "end", "width", "_inv_width")
+
     def __init__(
         self,
         term,
@@ -51,14 +60,48 @@ class Appearance:
             self.end = timestamp + width / 2
             self.width = width
 
+        # Cached for frame(), which multiplies instead of dividing:
+        self._inv_width = 1.0 / self.width if self.width > 0 else float("inf")
+
+    @classmethod
+    def _unchecked(cls, term, apid, start, end):
+        """Create an appearance from start and end without validating them.
+
+        For callers that already know their bounds are valid; skips `__init__`.
+        """
+        obj = cls.__new__(cls)
+        obj.term = term
+        obj.apid = apid
+        obj.start = start
+        obj.end = end
+        obj.width = end - start
+        obj._inv_width = 1.0 / obj.width if obj.width > 0 else float("inf")
+        return obj
+
+    @classmethod
+    def from_center(cls, term, apid, center, width):
+        """Create an appearance centered on `center`, lasting `width` in total.
+
+        Unlike the constructor, does not validate its arguments.
+        """
+        return cls._unchecked(term, apid, center - width / 2, center + width / 2)
+
+    @classmethod
+    def from_bounds(cls, term, apid, start, end):
+        """Create an appearance from its start and end time.
+
+        Unlike the constructor, does not validate its arguments.
+        """
+        return cls._unchecked(term, apid, start, end)
+
     def to_dict(self) -> dict:
         """Convert the appearance to a JSON-serializable dict."""
         return {
             "term": self.term,
             "apid": self.apid,
-            "start": round(self.start, 2),
-            "end": round(self.end, 2),
-            "width": round(self.width, 2),
+            "start": self.start,
+            "end": self.end,
+            "width": self.width,
         }
 
     def frame(self, t: float) -> float:
@@ -69,11 +112,24 @@ class Appearance:
         """
         if t <= self.start:
             return 0.0
-        elif self.end <= t:
+        if t >= self.end:
             return 1.0
-        else:
-            # Linear interpolation between start and end:
-            return (t - self.start) / (self.end - self.start)
+        # Linear interpolation between start and end:
+        return (t - self.start) * self._inv_width
+
+    def frame_vec(self, t):
+        """Get the values of the appearance at all times in t; vectorized `frame`.
+
+        Args:
+            t (np.ndarray): Times to evaluate.
+        Returns:
+            np.ndarray: The values of the appearance at times t.
+        """
+        t = np.asarray(t, dtype=float)
+        # Zero-width appearances give 0 * inf = nan at their start, masked here:
+        with np.errstate(invalid="ignore"):
+            ramp = (t - self.start) * self._inv_width
+        return np.where(t <= self.start, 0.0, np.where(t >= self.end, 1.0, ramp))
 
     def __repr__(self):
         return f"Appearance({self.term}, {self.start}, {self.end})"
@@ -96,7 +152,8 @@ class Appearance:
         if a.end <= b.start:
             raise ValueError("Cannot merge non-overlapping appearances.")
 
-        c = cls(a.term, a.apid, start=a.start, end=b.end)
+        # Bounds are checked above, so __init__'s validation can be skipped:
+        c = cls.from_bounds(a.term, a.apid, a.start, b.end)
 
         return c
 
@@ -106,9 +163,19 @@ class Ticker:
     def __init__(self):
         self.lanes = []
         self.fps = 24
+        self.end = 0.0  # end of the last appearance, kept up by add_appearance()
+        # Lane bookkeeping for add_appearance(): lanes still occupied, as a heap of
+        # (end of last appearance, lane index), and free lanes, as a heap of indices.
+        self._busy_lanes = []
+        self._free_lanes = []
+        self._last_start = float("-inf")
+        # `lanes` holds the only copy of the appearances; these just point into it:
+        self._by_apid = {}  # apid -> Appearance, for get_value()
+        self._lane_cursors = {}  # lane index -> position, for get_lane_value()
 
     def add_lane(self):
         """Add a new lane for a term."""
+        heapq.heappush(self._free_lanes, len(self.lanes))
         self.lanes.append([])
 
     def add_appearance(self, appearance: Appearance):
@@ -118,28 +185,64 @@ class Ticker:
         appearances overlapping into this appearance's extent. If no
         such lane exists, create a new one. This method takes care
         that appearances do not overlap.
+
+        Appearances must be added in order of their start. Then a lane that
+        is free for one appearance stays free for all later ones, so lanes
+        are moved from a heap of occupied lanes (by end) to a heap of free
+        lanes (by index) once, and placement costs O(log lanes).
         """
-        # Try to place in existing lanes:
-        for i, lane in enumerate(self.lanes):
-            if lane == []:
-                self.lanes[i].append(appearance)
-                return
-            else:
-                this_lanes_last: Appearance = lane[-1]
-                if this_lanes_last.end <= appearance.start:
-                    self.lanes[i].append(appearance)
-                    return
-
-        # If no suitable lane found, create a new one
-        self.lanes.append([appearance])
+        if appearance.start < self._last_start:
+            raise ValueError("Appearances must be added in order of their start.")
+        self._last_start = appearance.start
+
+        # Release lanes whose last appearance has ended:
+        while self._busy_lanes and self._busy_lanes[0][0] <= appearance.start:
+            _, i = heapq.heappop(self._busy_lanes)
+            heapq.heappush(self._free_lanes, i)
+
+        if self._free_lanes:
+            i = heapq.heappop(self._free_lanes)
+            self.lanes[i].append(appearance)
+        else:
+            # If no suitable lane found, create a new one
+            i = len(self.lanes)
+            self.lanes.append([appearance])
+
+        heapq.heappush(self._busy_lanes, (appearance.end, i))
+        if appearance.end > self.end:
+            self.end = appearance.end
+
+        self._by_apid.setdefault(appearance.apid, appearance)
 
     def get_value(self, apid, t) -> float:
         """Get the value of an appearance at time t."""
-        for lane in self.lanes:
-            for appearance in lane:
-                if appearance.apid == apid:
-                    return appearance.frame(t)
-        return 0.0
+        appearance = self._by_apid.get(apid)
+        if appearance is None:
+            return 0.0
+        return appearance.frame(t)
+
+    def get_lane_value(self, lane_idx, t) -> float:
+        """Get the value of a lane at time t.
+
+        That is the value of the lane's appearance that lasts over t (start <= t <
+        end), or 0.0 if there is none. Its appearances don't overlap, so it is the
+        first one ending after t, found by binary search on their ends. Queries with
+        non-decreasing t, as in a sweep over frames, just advance a per-lane cursor
+        instead, which is amortized O(1).
+        """
+        lane = self.lanes[lane_idx]
+        i = self._lane_cursors.get(lane_idx, 0)
+        if i > len(lane) or (i > 0 and lane[i - 1].end > t):
+            # t went back before the cursor:
+            i = bisect.bisect_right(lane, t, key=attrgetter("end"))
+        else:
+            while i < len(lane) and lane[i].end <= t:
+                i += 1
+        self._lane_cursors[lane_idx] = i
+
+        if i == len(lane):
+            return 0.0
+        return lane[i].frame(t)
 
     def to_dict(self):
         """Convert the ticker to a JSON-serializable dict."""
@@ -151,47 +254,108 @@ class Ticker:
             "end": self.end,
         }
 
-    def update_last_frame(self):
-        """Update the last frame of each appearance in the ticker."""
-        self.end = max(appearance.end for lane in self.lanes for appearance in lane)
+    def to_soa(self) -> tuple:
+        """Get the envelopes of all appearances as flat float32 arrays.
 
+        Appearances are lane by lane, in order within each lane, as in `to_arrays`.
 
-def plot_ticker(ticker):
-    import numpy as np
-    from plotly.subplots import make_subplots
-    import plotly.graph_objects as go
+        Returns:
+            tuple: (starts, ends, inv_widths), one entry per appearance each.
+        """
+        appearances = [appearance for lane in self.lanes for appearance in lane]
+        return tuple(
+            np.fromiter(
+                (getattr(ap, field) for ap in appearances),
+                dtype=np.float32,
+                count=len(appearances),
+            )
+            for field in ("start", "end", "_inv_width")
+        )
+
+    def get_values(self, ts):
+        """Get the values of all appearances at each of the times in ts.
+
+        Vectorized counterpart of `get_value`, computed in one float32 buffer.
 
+        Args:
+            ts (np.ndarray): Times to evaluate.
+        Returns:
+            np.ndarray: Values of shape (len(ts), appearances), appearances in
+            the order of `to_soa`.
+        """
+        starts, ends, inv_widths = self.to_soa()
+        ts = np.asarray(ts, dtype=np.float32)[:, None]
+        out = np.subtract(ts, starts)
+        # Zero-width appearances give 0 * inf = nan at their start; set below:
+        with np.errstate(invalid="ignore"):
+            np.multiply(out, inv_widths, out=out)
+        # Same order of checks as in get_value:
+        np.copyto(out, 1.0, where=ts >= ends)
+        np.copyto(out, 0.0, where=ts <= starts)
+        return out
+
+    def to_arrays(self) -> dict:
+        """Convert the ticker to flat NumPy arrays, one entry per appearance.
+
+        Appearances are lane by lane, as in `to_soa`; `lane` holds each one's
+        lane index. Strings are fixed-width unicode arrays, so the result can be
+        stored with `np.savez` and loaded without pickle (e.g. in Blender's
+        bundled Python).
+        """
+        starts, ends, _ = self.to_soa()
+        return {
+            "apids": np.array(
+                [ap.apid for lane in self.lanes for ap in lane], dtype=str
+            ),
+            "terms": np.array(
+                [ap.term for lane in self.lanes for ap in lane], dtype=str
+            ),
+            "lane": np.repeat(
+                np.arange(len(self.lanes), dtype=np.int32),
+                [len(lane) for lane in self.lanes],
+            ),
+            "starts": starts,
+            "ends": ends,
+            "fps": np.array(self.fps),
+            "end": np.array(self.end),
+        }
+
+
+def plot_ticker(ticker):
     nlanes = len(ticker.lanes)
     fig = make_subplots(rows=nlanes, cols=1, shared_xaxes=True, vertical_spacing=0.005)
 
+    # The envelope is a linear ramp from start to end, so a single grid over [0, 1]
+    # serves as the y values of every appearance, and scaled, as its x values:
+    u = np.linspace(0.0, 1.0, 100)
+
+    # One trace per lane; NaN points separate the appearances, as Plotly breaks
+    # lines (and their fill) there:
     for i, lane in enumerate(ticker.lanes):
-        for j, appearance in enumerate(lane):
-            x = np.linspace(appearance.start, appearance.end, 100)
-            y = [appearance.frame(k) for k in x]
-            fig.add_trace(
-                go.Scatter(
-                    x=x,
-                    y=y,
-                    mode="lines",
-                    name=appearance.apid,
-                    line=dict(width=1, color="blue"),
-                ),
-                row=nlanes - i,
-                col=1,
-            )
-            fig.add_trace(
-                go.Scatter(
-                    x=[min(x), max(x), max(x), min(x)],
-                    y=[min(y), min(y), max(y), max(y)],
-                    mode="lines",
-                    fill="toself",
-                    fillcolor="rgba(100, 100, 200, 0.1)",
-                    line=dict(width=0, color="rgba(0, 0, 0, 0)"),
-                    hoverinfo="skip",
-                ),
-                row=nlanes - i,
-                col=1,
-            )
+        if not lane:
+            continue  # nothing to draw, and nothing to concatenate
+
+        xs, ys, texts = [], [], []
+        for appearance in lane:
+            xs.extend([appearance.start + u * appearance.width, [np.nan]])
+            ys.extend([u, [np.nan]])
+            texts.extend([appearance.apid] * (len(u) + 1))
+
+        fig.add_trace(
+            go.Scatter(
+                x=np.concatenate(xs),
+                y=np.concatenate(ys),
+                text=texts,
+                mode="lines",
+                name=f"lane {i}",
+                fill="tozeroy",
+                fillcolor="rgba(100, 100, 200, 0.1)",
+                line=dict(width=1, color="blue"),
+                hoverinfo="x+text",
+            ),
+            row=nlanes - i,
+            col=1,
+        )
 
     fig.update_layout(
         height=600,
@@ -229,44 +393,50 @@ def ticker_from_timed_naments(named_entities: List[tuple], envelope_width: int =
     Returns:
         Ticker: A Ticker object with lanes filled with Appearances.
     """
-    import pandas as pd
-
-    df = pd.DataFrame(named_entities, columns=["token", "center"])
-    df.sort_values(["token", "center"], inplace=True)
-    df["enum"] = df.groupby("token").cumcount()
-    df["apid"] = (
-        df.token.str.replace(" ", "_").str.lower() + "." + df["enum"].astype(str)
-    )
+    # Appearances are built without Appearance's own checks, so check here:
+    if envelope_width <= 0:
+        raise ValueError("Envelope width must be positive.")
+
+    tokens = np.array([token for token, _ in named_entities], dtype=str)
+    centers = np.array([center for _, center in named_entities], dtype=np.float64)
+
+    # Sort by token, then center, and number the appearances of each token in turn:
+    order = np.lexsort((centers, tokens))
+    tokens, centers = tokens[order], centers[order]
+    types, group_idx, inverse = np.unique(tokens, return_index=True, return_inverse=True)
+    enum = np.arange(len(tokens)) - group_idx[inverse]
+    apids = np.char.add(
+        np.char.lower(np.char.replace(tokens, " ", "_")),
+        np.char.add(".", enum.astype(str)),
+    ).tolist()
 
     appearances = []
 
-    for type, grp in df.groupby("token"):
-        # In app_group, all tokens have an Appearance, even if they overlap temporally:
-        app_group = [
-            Appearance(
-                term=type,
-                apid=row["apid"],
-                timestamp=row["center"],
-                width=envelope_width,
+    for type, lo, hi in zip(
+        types.tolist(), group_idx, np.append(group_idx[1:], len(tokens))
+    ):
+        # Every token has an envelope, even if they overlap temporally; groups are
+        # sorted by center, so also by start:
+        starts = centers[lo:hi] - envelope_width / 2
+        ends = centers[lo:hi] + envelope_width / 2
+
+        # Merge overlapping appearances within the appearance group: a merged
+        # appearance begins wherever an envelope starts after all earlier ones of
+        # the group have ended, and lasts until the latest end among its members.
+        # It keeps the apid of its first member.
+        running_end = np.maximum.accumulate(ends)
+        is_first = np.ones(len(starts), dtype=bool)
+        is_first[1:] = starts[1:] > running_end[:-1]
+        first_idx = np.flatnonzero(is_first)
+
+        merged_group = [
+            Appearance.from_bounds(type, apids[lo + i], start, end)
+            for i, start, end in zip(
+                first_idx,
+                starts[first_idx],
+                np.maximum.reduceat(ends, first_idx),
             )
-            for _, row in grp.iterrows()
         ]
-        app_group.sort(key=lambda x: x.start)
-
-        # Merge overlapping appearances within the appearance group:
-        # Look at first and second appearance, if 1st is untouched; send to
-        # result list; if 2nd overlaps with 1st, merge them and continue with the next
-        # appearance (which may also overlap with the merged one) until no more
-        # overlaps are found - send the merged appearance to the result list.
-        merged_group = []
-        current = app_group[0]
-        for nxt in app_group[1:]:
-            if current.end < nxt.start:
-                merged_group.append(current)
-                current = nxt
-            else:
-                current = Appearance.merge(current, nxt)
-        merged_group.append(current)
         appearances.extend(merged_group)
 
     appearances.sort(key=lambda x: x.start)
@@ -275,6 +445,4 @@ def ticker_from_timed_naments(named_entities: List[tuple], envelope_width: int =
     for appearance in appearances:
         ticker.add_appearance(appearance)
 
-    ticker.update_last_frame()
-
     return ticker
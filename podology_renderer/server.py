@@ -1,10 +1,11 @@
-import json
 import os
-import pickle
 import sys
+import asyncio
 import secrets
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
 from pathlib import Path
-import shelve
 
 import uvicorn
 from loguru import logger
@@ -17,9 +18,13 @@ from fastapi import (
     Request,
     Depends,
 )
-from pydantic import BaseModel
+from pydantic import BaseModel, Json
 
-from podology_renderer.render.render_functions import process_video, get_jobs
+from podology_renderer.render.render_functions import (
+    process_video,
+    get_jobs,
+    close_jobs,
+)
 from podology_renderer.render.wordticker import ticker_from_timed_naments
 
 logger.remove()
@@ -30,14 +35,29 @@ load_dotenv(find_dotenv())
 API_TOKEN = os.getenv("API_TOKEN")
 UPLOAD_DIR = Path("/tmp/audio_files")
 UPLOAD_DIR.mkdir(parents=True, exist_ok=True)
-JDB = "jobs.db"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the job store and worker pool on startup, close them on shutdown."""
+    get_jobs()
+    # Tickers are built in worker processes, so that requests don't block the loop.
+    # Workers come from a fork server, as forking this threaded process is unsafe:
+    app.state.pool = ProcessPoolExecutor(
+        max_workers=2, mp_context=multiprocessing.get_context("forkserver")
+    )
+    yield
+    app.state.pool.shutdown()
+    close_jobs()
+
 
 # Create the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 
 class RenderRequest(BaseModel):
-    naments: str
+    # Still sent as a JSON string, but parsed and validated by pydantic in one go:
+    naments: Json[list[tuple[float, str]]]
     job_id: str
     frame_step: int = 10
 
@@ -65,7 +85,7 @@ async def render(
     Expects a JSON string in the format:
 
         [
-            ["token" {str}, timestamp {float}],
+            [timestamp {float}, "token" {str}],
             ...
         ]
 
@@ -79,8 +99,7 @@ async def render(
     Returns:
         A JSON response with a job ID for tracking the rendering process.
     """
-    naments = json.loads(req.naments)
-    naments = [(token, float(timestamp)) for timestamp, token in naments]
+    naments = [(token, timestamp) for timestamp, token in req.naments]
     frame_step = req.frame_step
 
     job_id = req.job_id
@@ -88,15 +107,15 @@ async def render(
     with get_jobs() as JOBS:
         JOBS[job_id] = {"status": "processing"}
 
-    # Prepare the ticker object:
-    ticker = ticker_from_timed_naments(naments)
-    ticker_path = Path(f"podology_renderer/render/tmp/{job_id}.pickle")
-    with open(ticker_path, "wb") as f:
-        pickle.dump(ticker, f)
+    # Prepare the ticker object, off the event loop so status polls stay responsive:
+    ticker = await asyncio.get_running_loop().run_in_executor(
+        app.state.pool, ticker_from_timed_naments, naments
+    )
 
-    # Start rendering background task with reference to the stored ticker:
+    # Start rendering background task; it runs in this process, so the ticker is
+    # handed over as is and only written to disk there, in the form Blender reads:
     background_tasks.add_task(
-        process_video, ticker_path=ticker_path, job_id=job_id, frame_step=frame_step
+        process_video, ticker=ticker, job_id=job_id, frame_step=frame_step
     )
 
     return {"job_id": job_id}
@@ -166,7 +185,7 @@ def get_result(
     request: Request = None,
     _: None = Depends(check_api_token),
 ):
-    with shelve.open(JDB, writeback=True) as JOBS:
+    with get_jobs() as JOBS:
         job = JOBS.get(job_id)
 
     if not job: